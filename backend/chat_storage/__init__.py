@@ -0,0 +1,72 @@
+"""Camada de acesso a dados compartilhada pelos serviços de autenticação e mensagens.
+
+Backend escolhido por `STORAGE_BACKEND` (`dynamodb` ou `memory`); veja `create_storage`.
+"""
+import os
+
+from .base import (
+    CONTADORES_TABLE,
+    HIERARQUIA_TABLE,
+    MENSAGENS_TABLE,
+    READ_RECEIPTS_TABLE,
+    ROLES,
+    TABLE_SCHEMAS,
+    USUARIOS_TABLE,
+    AlreadyExistsError,
+    ChatStorage,
+    HierarchyNode,
+    MessageRecord,
+    StorageError,
+    UserRecord,
+)
+from .archive import MessageArchive
+from .history import MessageHistory
+from .memory import InMemoryStorage
+
+
+def create_storage() -> ChatStorage:
+    """Monta o backend a partir das variáveis de ambiente.
+
+    - `STORAGE_BACKEND`: `dynamodb` (padrão) ou `memory`.
+    - `IS_LOCAL=true`: aponta para o DynamoDB Local (`DYNAMODB_ENDPOINT`, padrão `http://dynamodb-local:8000`).
+    - `DYNAMODB_MAX_POOL_CONNECTIONS` / `DYNAMODB_MAX_ATTEMPTS`: tamanho do pool e tentativas do retry adaptativo.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "dynamodb").lower()
+    if backend == "memory":
+        return InMemoryStorage()
+    if backend != "dynamodb":
+        raise ValueError(f"STORAGE_BACKEND desconhecido: {backend}")
+
+    # Import tardio: o backend em memória não depende do aioboto3.
+    from .dynamo import DynamoStorage
+
+    is_local = os.getenv("IS_LOCAL", "false").lower() == "true"
+    endpoint_url = os.getenv("DYNAMODB_ENDPOINT") or ('http://dynamodb-local:8000' if is_local else None)
+    credentials = {'aws_access_key_id': 'dummykey', 'aws_secret_access_key': 'dummysecret'} if is_local else None
+    return DynamoStorage(
+        endpoint_url=endpoint_url,
+        credentials=credentials,
+        max_pool_connections=int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "50")),
+        max_attempts=int(os.getenv("DYNAMODB_MAX_ATTEMPTS", "5")),
+    )
+
+
+__all__ = [
+    'CONTADORES_TABLE',
+    'HIERARQUIA_TABLE',
+    'MENSAGENS_TABLE',
+    'READ_RECEIPTS_TABLE',
+    'ROLES',
+    'TABLE_SCHEMAS',
+    'USUARIOS_TABLE',
+    'AlreadyExistsError',
+    'ChatStorage',
+    'HierarchyNode',
+    'InMemoryStorage',
+    'MessageArchive',
+    'MessageHistory',
+    'MessageRecord',
+    'StorageError',
+    'UserRecord',
+    'create_storage',
+]
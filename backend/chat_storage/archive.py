@@ -0,0 +1,203 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from .base import MessageRecord, StorageError
+
+# Cada bloco do segmento: [tamanho do payload (4 bytes, big-endian)][zlib(JSON da lista de mensagens)]
+_BLOCK_HEADER = struct.Struct('>I')
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+
+class IndexEntry(NamedTuple):
+    segment: str
+    offset: int
+    length: int
+    count: int
+    first_ts: str
+    last_ts: str
+
+
+def _json_default(value):
+    # O DynamoDB devolve números como Decimal.
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+class MessageArchive:
+    """Armazenamento frio das mensagens antigas, em segmentos append-only particionados por dia.
+
+    Para cada dia existe `<YYYY-MM-DD>.seg` (blocos comprimidos, um por canal e por
+    rodada de arquivamento) e `<YYYY-MM-DD>.idx` (JSON lines com o offset de cada bloco).
+    O índice por canal fica em memória; a leitura dos blocos usa mmap.
+    """
+
+    def __init__(self, directory: str, compression_level: int = 6):
+        self.directory = directory
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[IndexEntry]] = defaultdict(list)
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, segment: str, suffix: str) -> str:
+        return os.path.join(self.directory, segment + suffix)
+
+    def _load_index(self) -> None:
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(INDEX_SUFFIX):
+                continue
+            segment = name[:-len(INDEX_SUFFIX)]
+            try:
+                segment_size = os.path.getsize(self._path(segment, SEGMENT_SUFFIX))
+            except OSError:
+                continue
+            with open(self._path(segment, INDEX_SUFFIX), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        raw = json.loads(line)
+                    except ValueError:
+                        continue  # linha truncada por uma queda durante a escrita
+                    entry = IndexEntry(segment, raw['offset'], raw['length'], raw['count'], raw['firstTs'], raw['lastTs'])
+                    # Ignora entradas que apontam além do fim do segmento.
+                    if entry.offset + entry.length <= segment_size:
+                        self._index[raw['channelId']].append(entry)
+        for entries in self._index.values():
+            entries.sort(key=lambda e: e.last_ts)
+
+    def append(self, messages: List[MessageRecord]) -> int:
+        """Grava as mensagens nos segmentos do dia de cada uma. Retorna quantas foram gravadas.
+
+        Idempotente: mensagens cujo id já está arquivado no canal (em blocos do mesmo
+        intervalo de tempo) são ignoradas, então repetir uma rodada não duplica nada.
+        O segmento é sincronizado em disco antes do índice, então uma queda no meio
+        da escrita nunca deixa uma entrada de índice apontando para dados inexistentes.
+        """
+        groups: Dict[str, Dict[str, List[MessageRecord]]] = defaultdict(lambda: defaultdict(list))
+        for message in messages:
+            groups[message['timestamp'][:10]][message['channelId']].append(message)
+
+        written = 0
+        with self._lock:
+            for segment, channels in sorted(groups.items()):
+                pending = {}
+                for channel_id, channel_messages in channels.items():
+                    channel_messages.sort(key=lambda m: m['timestamp'])
+                    archived = self._archived_ids(channel_id, channel_messages[0]['timestamp'], channel_messages[-1]['timestamp'])
+                    unique = {}
+                    for m in channel_messages:
+                        if m['id'] not in archived:
+                            unique.setdefault(m['id'], m)
+                    if unique:
+                        pending[channel_id] = list(unique.values())
+                if not pending:
+                    continue
+                new_entries = []
+                with open(self._path(segment, SEGMENT_SUFFIX), 'ab') as seg:
+                    for channel_id, channel_messages in pending.items():
+                        written += len(channel_messages)
+                        payload = zlib.compress(
+                            json.dumps(channel_messages, default=_json_default, separators=(',', ':')).encode('utf-8'),
+                            self.compression_level,
+                        )
+                        offset = seg.tell() + _BLOCK_HEADER.size
+                        seg.write(_BLOCK_HEADER.pack(len(payload)))
+                        seg.write(payload)
+                        new_entries.append((channel_id, IndexEntry(
+                            segment, offset, len(payload), len(channel_messages),
+                            channel_messages[0]['timestamp'], channel_messages[-1]['timestamp'],
+                        )))
+                    seg.flush()
+                    os.fsync(seg.fileno())
+                with open(self._path(segment, INDEX_SUFFIX), 'a', encoding='utf-8') as idx:
+                    for channel_id, entry in new_entries:
+                        idx.write(json.dumps({
+                            'channelId': channel_id, 'offset': entry.offset, 'length': entry.length,
+                            'count': entry.count, 'firstTs': entry.first_ts, 'lastTs': entry.last_ts,
+                        }) + '\n')
+                    idx.flush()
+                    os.fsync(idx.fileno())
+                for channel_id, entry in new_entries:
+                    entries = self._index[channel_id]
+                    entries.append(entry)
+                    entries.sort(key=lambda e: e.last_ts)
+        return written
+
+    def channels(self) -> List[str]:
+        """Canais que têm pelo menos um bloco arquivado."""
+        with self._lock:
+            return [channel_id for channel_id, entries in self._index.items() if entries]
+
+    def _archived_ids(self, channel_id: str, first_ts: str, last_ts: str) -> Set[str]:
+        """Ids já arquivados no canal em blocos que se sobrepõem a [first_ts, last_ts]."""
+        overlapping = [e for e in self._index.get(channel_id, ()) if e.first_ts <= last_ts and e.last_ts >= first_ts]
+        ids: Set[str] = set()
+        with _SegmentMaps(self) as maps:
+            for entry in overlapping:
+                ids.update(m['id'] for m in maps.read(entry))
+        return ids
+
+    def read(self, channel_id: str, limit: int = 50, before: Optional[str] = None) -> List[MessageRecord]:
+        """Retorna até `limit` mensagens arquivadas do canal anteriores a `before`, da mais nova para a mais antiga."""
+        with self._lock:
+            entries = list(self._index.get(channel_id, ()))
+
+        # Deduplicado por id: uma mensagem pode ter sido arquivada em mais de uma rodada
+        # (ex.: arquivos gravados por uma versão anterior, sem a verificação de append).
+        collected: Dict[str, MessageRecord] = {}
+        with _SegmentMaps(self) as maps:
+            # Os blocos podem se sobrepor no tempo (rodadas diferentes), então só paramos
+            # quando o próximo bloco é inteiramente mais antigo que a `limit`-ésima mensagem já lida.
+            for entry in reversed(entries):
+                if before is not None and entry.first_ts >= before:
+                    continue
+                if len(collected) >= limit:
+                    newest = sorted(collected.values(), key=lambda m: m['timestamp'], reverse=True)[:limit]
+                    collected = {m['id']: m for m in newest}
+                    if entry.last_ts < newest[-1]['timestamp']:
+                        break
+                for m in maps.read(entry):
+                    if before is None or m['timestamp'] < before:
+                        collected.setdefault(m['id'], m)
+
+        return sorted(collected.values(), key=lambda m: m['timestamp'], reverse=True)[:limit]
+
+
+class _SegmentMaps:
+    """Mantém um mmap por segmento aberto durante uma leitura e fecha todos ao sair."""
+
+    def __init__(self, archive: MessageArchive):
+        self._archive = archive
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+    def read(self, entry: IndexEntry) -> List[MessageRecord]:
+        """Decodifica um bloco. Bloco ilegível ou corrompido vira `StorageError`."""
+        try:
+            if entry.segment not in self._maps:
+                with open(self._archive._path(entry.segment, SEGMENT_SUFFIX), 'rb') as seg:
+                    self._maps[entry.segment] = mmap.mmap(seg.fileno(), 0, access=mmap.ACCESS_READ)
+            payload = self._maps[entry.segment][entry.offset:entry.offset + entry.length]
+            messages = json.loads(zlib.decompress(payload))
+        except (OSError, ValueError, zlib.error) as exc:
+            raise StorageError(f"Bloco corrompido em {entry.segment}@{entry.offset}: {exc}") from exc
+        if not isinstance(messages, list) or not all(
+            isinstance(m, dict) and isinstance(m.get('id'), str) and isinstance(m.get('timestamp'), str) for m in messages
+        ):
+            raise StorageError(f"Bloco corrompido em {entry.segment}@{entry.offset}: formato inesperado")
+        return messages
@@ -0,0 +1,154 @@
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, TypedDict
+
+# --- Nomes das Tabelas ---
+USUARIOS_TABLE = 'ChatUsuarios'
+HIERARQUIA_TABLE = 'ChatHierarquia'
+CONTADORES_TABLE = 'ChatContadores'
+READ_RECEIPTS_TABLE = 'ChatReadReceipts'
+MENSAGENS_TABLE = 'ChatMensagens'
+
+# Esquemas usados para criar as tabelas no DynamoDB Local: (KeySchema, AttributeDefinitions)
+TABLE_SCHEMAS: Dict[str, Any] = {
+    USUARIOS_TABLE: (
+        [{'AttributeName': 'email', 'KeyType': 'HASH'}],
+        [{'AttributeName': 'email', 'AttributeType': 'S'}],
+    ),
+    HIERARQUIA_TABLE: (
+        [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        [{'AttributeName': 'id', 'AttributeType': 'S'}],
+    ),
+    CONTADORES_TABLE: (
+        [{'AttributeName': 'role', 'KeyType': 'HASH'}],
+        [{'AttributeName': 'role', 'AttributeType': 'S'}],
+    ),
+    READ_RECEIPTS_TABLE: (
+        [{'AttributeName': 'userId', 'KeyType': 'HASH'}, {'AttributeName': 'channelId', 'KeyType': 'RANGE'}],
+        [{'AttributeName': 'userId', 'AttributeType': 'S'}, {'AttributeName': 'channelId', 'AttributeType': 'S'}],
+    ),
+    MENSAGENS_TABLE: (
+        [{'AttributeName': 'channelId', 'KeyType': 'HASH'}, {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}],
+        [{'AttributeName': 'channelId', 'AttributeType': 'S'}, {'AttributeName': 'timestamp', 'AttributeType': 'S'}],
+    ),
+}
+
+ROLES = ['director', 'manager', 'supervisor', 'employee']
+
+
+# --- Erros ---
+class StorageError(Exception):
+    """Falha genérica na camada de armazenamento (independe do backend)."""
+
+
+class AlreadyExistsError(StorageError):
+    """A escrita condicional falhou porque o item já existe."""
+
+
+# --- Registros ---
+class UserRecord(TypedDict):
+    id: str
+    email: str
+    hashed_password: str
+    name: str
+    role: str
+
+
+class HierarchyNode(TypedDict, total=False):
+    id: str
+    name: str
+    role: str
+    email: str
+    status: str
+    children: List['HierarchyNode']
+
+
+class MessageRecord(TypedDict, total=False):
+    id: str
+    channelId: str
+    senderId: str
+    senderName: str
+    senderRole: str
+    content: str
+    priority: str
+    timestamp: str
+
+
+class ChatStorage(ABC):
+    """Interface comum de acesso a dados usada pelos dois serviços.
+
+    Implementações: `DynamoStorage` (aioboto3) e `InMemoryStorage` (testes/benchmarks).
+    Todas as falhas do backend são traduzidas para `StorageError`.
+    """
+
+    async def start(self) -> None:
+        """Abre recursos (clientes, pools). Não deve bloquear esperando o banco."""
+
+    async def close(self) -> None:
+        """Libera os recursos abertos em `start`."""
+
+    @abstractmethod
+    async def ensure_tables(self, table_names: List[str]) -> None:
+        """Cria as tabelas informadas caso ainda não existam."""
+
+    # --- Contadores ---
+    @abstractmethod
+    async def init_counters(self, roles: List[str]) -> None:
+        """Cria o contador (zerado) de cada cargo que ainda não tiver um."""
+
+    @abstractmethod
+    async def increment_counter(self, role: str) -> int:
+        """Incrementa atomicamente o contador do cargo e retorna o novo valor."""
+
+    # --- Usuários ---
+    @abstractmethod
+    async def create_user(self, user: UserRecord) -> None:
+        """Grava o usuário. Levanta `AlreadyExistsError` se o email já existir."""
+
+    @abstractmethod
+    async def get_user(self, email: str) -> Optional[UserRecord]:
+        ...
+
+    # --- Hierarquia ---
+    @abstractmethod
+    async def get_hierarchy(self) -> List[HierarchyNode]:
+        ...
+
+    @abstractmethod
+    async def add_hierarchy_root(self, node: HierarchyNode) -> None:
+        """Grava um nó raiz. Levanta `AlreadyExistsError` se o id já existir."""
+
+    @abstractmethod
+    async def append_hierarchy_child(self, manager_id: str, node: HierarchyNode) -> None:
+        """Adiciona `node` à lista `children` do nó `manager_id` (criando-a se preciso)."""
+
+    # --- Mensagens ---
+    @abstractmethod
+    async def put_message(self, message: MessageRecord) -> None:
+        ...
+
+    @abstractmethod
+    async def get_channel_messages(self, channel_id: str, limit: int = 50, before: Optional[str] = None) -> List[MessageRecord]:
+        """Retorna as `limit` mensagens mais recentes do canal (anteriores a `before`, se informado),
+        da mais nova para a mais antiga."""
+
+    @abstractmethod
+    async def get_private_messages(self, user_id: str) -> List[MessageRecord]:
+        """Retorna as mensagens de todos os canais `private-` que envolvem o usuário."""
+
+    @abstractmethod
+    def iter_messages_before(self, cutoff: str, batch_size: int = 500) -> AsyncIterator[List[MessageRecord]]:
+        """Percorre as mensagens (de qualquer canal) com `timestamp` anterior a `cutoff`, em lotes
+        de no máximo `batch_size`. Apagar as mensagens de um lote já entregue é seguro."""
+
+    @abstractmethod
+    async def delete_messages(self, messages: List[MessageRecord]) -> None:
+        """Remove as mensagens da tabela quente (chave: channelId + timestamp)."""
+
+    # --- Read Receipts ---
+    @abstractmethod
+    async def put_read_receipt(self, user_id: str, channel_id: str, last_read_timestamp: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get_read_receipts(self, user_id: str) -> Dict[str, str]:
+        """Retorna {channelId: lastReadTimestamp} do usuário."""
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import random
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aioboto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .base import (
+    CONTADORES_TABLE,
+    HIERARQUIA_TABLE,
+    MENSAGENS_TABLE,
+    READ_RECEIPTS_TABLE,
+    TABLE_SCHEMAS,
+    USUARIOS_TABLE,
+    AlreadyExistsError,
+    ChatStorage,
+    HierarchyNode,
+    MessageRecord,
+    StorageError,
+    UserRecord,
+)
+
+logger = logging.getLogger("chat-storage")
+
+
+def _is_condition_failure(exc: ClientError) -> bool:
+    return exc.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class DynamoStorage(ChatStorage):
+    """Backend DynamoDB assíncrono (aioboto3) com um único pool de conexões por processo.
+
+    O botocore cuida do retry com backoff adaptativo (modo `adaptive`, que também
+    limita a taxa do lado do cliente quando o DynamoDB devolve throttling).
+    """
+
+    def __init__(
+        self,
+        endpoint_url: Optional[str] = None,
+        region_name: str = 'us-east-1',
+        credentials: Optional[Dict[str, str]] = None,
+        max_pool_connections: int = 50,
+        max_attempts: int = 5,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+    ):
+        self._session = aioboto3.Session(region_name=region_name, **(credentials or {}))
+        self._endpoint_url = endpoint_url
+        self._config = Config(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            retries={'mode': 'adaptive', 'max_attempts': max_attempts},
+        )
+        self._stack: Optional[AsyncExitStack] = None
+        self._resource = None
+        self._tables: Dict[str, Any] = {}
+
+    async def start(self) -> None:
+        # Só cria o cliente; nenhuma chamada de rede é feita aqui.
+        if self._resource is not None:
+            return
+        self._stack = AsyncExitStack()
+        self._resource = await self._stack.enter_async_context(
+            self._session.resource('dynamodb', endpoint_url=self._endpoint_url, config=self._config)
+        )
+
+    async def close(self) -> None:
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = None
+        self._resource = None
+        self._tables.clear()
+
+    async def _table(self, name: str):
+        if self._resource is None:
+            await self.start()
+        if name not in self._tables:
+            self._tables[name] = await self._resource.Table(name)
+        return self._tables[name]
+
+    async def ensure_tables(self, table_names: List[str], max_retries: int = 8, base_delay: float = 0.5) -> None:
+        """Cria as tabelas que faltam, com backoff exponencial enquanto o DynamoDB não responde."""
+        pending = list(table_names)
+        for attempt in range(1, max_retries + 1):
+            try:
+                while pending:
+                    await self._create_table(pending[0])
+                    pending.pop(0)
+                return
+            except (BotoCoreError, ClientError) as exc:
+                if attempt == max_retries:
+                    raise StorageError(f"Falha ao preparar tabelas {pending}: {exc}") from exc
+                delay = min(base_delay * 2 ** (attempt - 1), 10.0) * random.uniform(0.5, 1.0)
+                logger.warning(f"[DynamoDB] Tabelas indisponíveis (tentativa {attempt}/{max_retries}): {exc}. Nova tentativa em {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _create_table(self, table_name: str) -> None:
+        key_schema, attribute_definitions = TABLE_SCHEMAS[table_name]
+        if self._resource is None:
+            await self.start()
+        try:
+            await self._resource.create_table(
+                TableName=table_name,
+                KeySchema=key_schema,
+                AttributeDefinitions=attribute_definitions,
+                ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5},
+            )
+            logger.info(f"Criando tabela '{table_name}'...")
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') != 'ResourceInUseException':
+                raise
+        table = await self._table(table_name)
+        await table.wait_until_exists()
+
+    # --- Contadores ---
+    async def init_counters(self, roles: List[str]) -> None:
+        table = await self._table(CONTADORES_TABLE)
+        for role in roles:
+            try:
+                await table.put_item(Item={'role': role, 'count': 0}, ConditionExpression='attribute_not_exists(#r)', ExpressionAttributeNames={'#r': 'role'})
+            except ClientError as exc:
+                if not _is_condition_failure(exc):
+                    raise StorageError(str(exc)) from exc
+            except BotoCoreError as exc:
+                raise StorageError(str(exc)) from exc
+
+    async def increment_counter(self, role: str) -> int:
+        table = await self._table(CONTADORES_TABLE)
+        try:
+            response = await table.update_item(
+                Key={'role': role},
+                UpdateExpression='SET #c = #c + :val',
+                ExpressionAttributeNames={'#c': 'count'},
+                ExpressionAttributeValues={':val': 1},
+                ReturnValues="UPDATED_NEW"
+            )
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+        return int(response['Attributes']['count'])
+
+    # --- Usuários ---
+    async def create_user(self, user: UserRecord) -> None:
+        table = await self._table(USUARIOS_TABLE)
+        try:
+            await table.put_item(Item=user, ConditionExpression='attribute_not_exists(email)')
+        except ClientError as exc:
+            if _is_condition_failure(exc):
+                raise AlreadyExistsError(f"Usuário '{user['email']}' já existe") from exc
+            raise StorageError(str(exc)) from exc
+        except BotoCoreError as exc:
+            raise StorageError(str(exc)) from exc
+
+    async def get_user(self, email: str) -> Optional[UserRecord]:
+        table = await self._table(USUARIOS_TABLE)
+        try:
+            response = await table.get_item(Key={'email': email})
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+        return response.get('Item')
+
+    # --- Hierarquia ---
+    async def get_hierarchy(self) -> List[HierarchyNode]:
+        return await self._scan(HIERARQUIA_TABLE)
+
+    async def add_hierarchy_root(self, node: HierarchyNode) -> None:
+        table = await self._table(HIERARQUIA_TABLE)
+        try:
+            await table.put_item(Item=node, ConditionExpression='attribute_not_exists(id)')
+        except ClientError as exc:
+            if _is_condition_failure(exc):
+                raise AlreadyExistsError(f"Nó '{node['id']}' já existe") from exc
+            raise StorageError(str(exc)) from exc
+        except BotoCoreError as exc:
+            raise StorageError(str(exc)) from exc
+
+    async def append_hierarchy_child(self, manager_id: str, node: HierarchyNode) -> None:
+        table = await self._table(HIERARQUIA_TABLE)
+        try:
+            await table.update_item(
+                Key={'id': manager_id},
+                UpdateExpression='SET #children = list_append(if_not_exists(#children, :empty_list), :new_node)',
+                ExpressionAttributeNames={'#children': 'children'},
+                ExpressionAttributeValues={':new_node': [node], ':empty_list': []}
+            )
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    # --- Mensagens ---
+    async def put_message(self, message: MessageRecord) -> None:
+        table = await self._table(MENSAGENS_TABLE)
+        try:
+            await table.put_item(Item=message)
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    async def get_channel_messages(self, channel_id: str, limit: int = 50, before: Optional[str] = None) -> List[MessageRecord]:
+        table = await self._table(MENSAGENS_TABLE)
+        condition = Key('channelId').eq(channel_id)
+        if before is not None:
+            condition = condition & Key('timestamp').lt(before)
+        try:
+            response = await table.query(KeyConditionExpression=condition, Limit=limit, ScanIndexForward=False)
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+        return response.get('Items', [])
+
+    async def get_private_messages(self, user_id: str) -> List[MessageRecord]:
+        return await self._scan(
+            MENSAGENS_TABLE,
+            FilterExpression=Attr('channelId').contains(user_id) & Attr('channelId').begins_with('private-'),
+        )
+
+    async def iter_messages_before(self, cutoff: str, batch_size: int = 500) -> AsyncIterator[List[MessageRecord]]:
+        # Uma página do scan por lote: `Limit` limita os itens lidos, então cada lote tem no máximo `batch_size`.
+        table = await self._table(MENSAGENS_TABLE)
+        kwargs: Dict[str, Any] = {'FilterExpression': Attr('timestamp').lt(cutoff), 'Limit': batch_size}
+        while True:
+            try:
+                response = await table.scan(**kwargs)
+            except (BotoCoreError, ClientError) as exc:
+                raise StorageError(str(exc)) from exc
+            if response.get('Items'):
+                yield response['Items']
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    async def delete_messages(self, messages: List[MessageRecord]) -> None:
+        table = await self._table(MENSAGENS_TABLE)
+        try:
+            async with table.batch_writer(overwrite_by_pkeys=['channelId', 'timestamp']) as batch:
+                for message in messages:
+                    await batch.delete_item(Key={'channelId': message['channelId'], 'timestamp': message['timestamp']})
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    # --- Read Receipts ---
+    async def put_read_receipt(self, user_id: str, channel_id: str, last_read_timestamp: str) -> None:
+        table = await self._table(READ_RECEIPTS_TABLE)
+        try:
+            await table.put_item(Item={'userId': user_id, 'channelId': channel_id, 'lastReadTimestamp': last_read_timestamp})
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    async def get_read_receipts(self, user_id: str) -> Dict[str, str]:
+        table = await self._table(READ_RECEIPTS_TABLE)
+        receipts: Dict[str, str] = {}
+        kwargs: Dict[str, Any] = {'KeyConditionExpression': Key('userId').eq(user_id)}
+        try:
+            while True:
+                response = await table.query(**kwargs)
+                for item in response.get('Items', []):
+                    receipts[item['channelId']] = item['lastReadTimestamp']
+                if 'LastEvaluatedKey' not in response:
+                    return receipts
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
+
+    async def _scan(self, table_name: str, **kwargs) -> List[Dict[str, Any]]:
+        """Scan paginado (segue LastEvaluatedKey até o fim da tabela)."""
+        table = await self._table(table_name)
+        items: List[Dict[str, Any]] = []
+        try:
+            while True:
+                response = await table.scan(**kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except (BotoCoreError, ClientError) as exc:
+            raise StorageError(str(exc)) from exc
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from .archive import MessageArchive
+from .base import ChatStorage, MessageRecord
+
+logger = logging.getLogger("chat-storage")
+
+
+class MessageHistory:
+    """Leitura unificada do histórico: tabela quente primeiro, depois o arquivo frio.
+
+    Também executa o arquivamento (tabela quente -> segmentos) das mensagens mais
+    antigas que `max_age`. Sem `archive`, funciona apenas sobre a tabela quente.
+    """
+
+    def __init__(self, storage: ChatStorage, archive: Optional[MessageArchive] = None):
+        self.storage = storage
+        self.archive = archive
+
+    async def get_channel_history(self, channel_id: str, limit: int = 50, before: Optional[str] = None) -> List[MessageRecord]:
+        """Retorna até `limit` mensagens do canal anteriores a `before`, da mais nova para a mais antiga."""
+        messages = await self.storage.get_channel_messages(channel_id, limit=limit, before=before)
+        if self.archive is None or len(messages) >= limit:
+            return messages
+        # A tabela quente esgotou: continua a partir da mensagem quente mais antiga.
+        cold_before = messages[-1]['timestamp'] if messages else before
+        cold = await asyncio.to_thread(self.archive.read, channel_id, limit - len(messages), cold_before)
+        seen = {m['id'] for m in messages}
+        return messages + [m for m in cold if m['id'] not in seen]
+
+    async def get_private_history(self, user_id: str, limit: int = 50) -> List[MessageRecord]:
+        """Mensagens dos canais `private-` do usuário: todas as da tabela quente e, por canal,
+        as arquivadas até completar `limit` (como em `get_channel_history`)."""
+        hot = await self.storage.get_private_messages(user_id)
+        if self.archive is None:
+            return hot
+
+        by_channel: Dict[str, List[MessageRecord]] = {}
+        for message in hot:
+            by_channel.setdefault(message['channelId'], []).append(message)
+        # Mesma regra do scan da tabela quente (prefixo `private-` e id do usuário no channelId).
+        for channel_id in self.archive.channels():
+            if channel_id.startswith('private-') and user_id in channel_id:
+                by_channel.setdefault(channel_id, [])
+
+        messages = list(hot)
+        for channel_id, channel_hot in by_channel.items():
+            if len(channel_hot) >= limit:
+                continue
+            cold_before = min(m['timestamp'] for m in channel_hot) if channel_hot else None
+            cold = await asyncio.to_thread(self.archive.read, channel_id, limit - len(channel_hot), cold_before)
+            seen = {m['id'] for m in channel_hot}
+            messages.extend(m for m in cold if m['id'] not in seen)
+        return messages
+
+    async def archive_older_than(self, max_age: timedelta, batch_size: int = 500) -> int:
+        """Move para o arquivo as mensagens mais antigas que `max_age`. Retorna quantas foram movidas.
+
+        Trabalha em lotes de até `batch_size` (memória limitada mesmo na primeira rodada).
+        Cada lote é gravado no arquivo antes de ser apagado da tabela quente: uma falha no
+        meio deixa a mensagem nos dois lugares, nunca em nenhum. A rodada seguinte tenta
+        apagar de novo e `MessageArchive.append` ignora os ids já arquivados.
+        """
+        if self.archive is None:
+            return 0
+        cutoff = (datetime.now() - max_age).isoformat()
+        moved = written = 0
+        async for batch in self.storage.iter_messages_before(cutoff, batch_size=batch_size):
+            written += await asyncio.to_thread(self.archive.append, batch)
+            await self.storage.delete_messages(batch)
+            moved += len(batch)
+        if moved:
+            logger.info(f"[Arquivo] {moved} mensagens ({written} novas no arquivo) anteriores a {cutoff} movidas para {self.archive.directory}")
+        return moved
@@ -0,0 +1,112 @@
+import bisect
+import copy
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .base import (
+    AlreadyExistsError,
+    ChatStorage,
+    HierarchyNode,
+    MessageRecord,
+    UserRecord,
+)
+
+
+class InMemoryStorage(ChatStorage):
+    """Backend puramente em memória com a mesma semântica das tabelas DynamoDB.
+
+    Útil para testes e benchmarks sem banco externo. Os itens são copiados na
+    entrada e na saída, como aconteceria com uma ida e volta ao DynamoDB.
+    """
+
+    def __init__(self):
+        self._users: Dict[str, UserRecord] = {}
+        self._hierarchy: Dict[str, HierarchyNode] = {}
+        self._counters: Dict[str, int] = {}
+        self._receipts: Dict[Tuple[str, str], str] = {}
+        # channelId -> (timestamps ordenados, {timestamp: mensagem})
+        self._messages: Dict[str, Tuple[List[str], Dict[str, MessageRecord]]] = {}
+
+    async def ensure_tables(self, table_names: List[str]) -> None:
+        pass
+
+    # --- Contadores ---
+    async def init_counters(self, roles: List[str]) -> None:
+        for role in roles:
+            self._counters.setdefault(role, 0)
+
+    async def increment_counter(self, role: str) -> int:
+        self._counters[role] = self._counters.get(role, 0) + 1
+        return self._counters[role]
+
+    # --- Usuários ---
+    async def create_user(self, user: UserRecord) -> None:
+        if user['email'] in self._users:
+            raise AlreadyExistsError(f"Usuário '{user['email']}' já existe")
+        self._users[user['email']] = copy.deepcopy(user)
+
+    async def get_user(self, email: str) -> Optional[UserRecord]:
+        user = self._users.get(email)
+        return copy.deepcopy(user) if user else None
+
+    # --- Hierarquia ---
+    async def get_hierarchy(self) -> List[HierarchyNode]:
+        return copy.deepcopy(list(self._hierarchy.values()))
+
+    async def add_hierarchy_root(self, node: HierarchyNode) -> None:
+        if node['id'] in self._hierarchy:
+            raise AlreadyExistsError(f"Nó '{node['id']}' já existe")
+        self._hierarchy[node['id']] = copy.deepcopy(node)
+
+    async def append_hierarchy_child(self, manager_id: str, node: HierarchyNode) -> None:
+        # Como o update_item do DynamoDB, cria o item se ele ainda não existir.
+        manager = self._hierarchy.setdefault(manager_id, {'id': manager_id})
+        manager.setdefault('children', []).append(copy.deepcopy(node))
+
+    # --- Mensagens ---
+    async def put_message(self, message: MessageRecord) -> None:
+        timestamps, items = self._messages.setdefault(message['channelId'], ([], {}))
+        if message['timestamp'] not in items:
+            bisect.insort(timestamps, message['timestamp'])
+        items[message['timestamp']] = copy.deepcopy(message)
+
+    async def get_channel_messages(self, channel_id: str, limit: int = 50, before: Optional[str] = None) -> List[MessageRecord]:
+        timestamps, items = self._messages.get(channel_id, ([], {}))
+        end = bisect.bisect_left(timestamps, before) if before is not None else len(timestamps)
+        newest = timestamps[max(0, end - limit):end][::-1]
+        return [copy.deepcopy(items[ts]) for ts in newest]
+
+    async def get_private_messages(self, user_id: str) -> List[MessageRecord]:
+        result: List[MessageRecord] = []
+        for channel_id, (timestamps, items) in self._messages.items():
+            if channel_id.startswith('private-') and user_id in channel_id:
+                result.extend(copy.deepcopy(items[ts]) for ts in timestamps)
+        return result
+
+    async def iter_messages_before(self, cutoff: str, batch_size: int = 500) -> AsyncIterator[List[MessageRecord]]:
+        # Fotografa só as chaves; os itens são copiados lote a lote (e podem ter sido apagados no meio).
+        keys = [
+            (channel_id, ts)
+            for channel_id, (timestamps, _) in self._messages.items()
+            for ts in timestamps[:bisect.bisect_left(timestamps, cutoff)]
+        ]
+        for start in range(0, len(keys), batch_size):
+            batch = []
+            for channel_id, ts in keys[start:start + batch_size]:
+                item = self._messages[channel_id][1].get(ts)
+                if item is not None:
+                    batch.append(copy.deepcopy(item))
+            if batch:
+                yield batch
+
+    async def delete_messages(self, messages: List[MessageRecord]) -> None:
+        for message in messages:
+            timestamps, items = self._messages.get(message['channelId'], ([], {}))
+            if items.pop(message['timestamp'], None) is not None:
+                timestamps.pop(bisect.bisect_left(timestamps, message['timestamp']))
+
+    # --- Read Receipts ---
+    async def put_read_receipt(self, user_id: str, channel_id: str, last_read_timestamp: str) -> None:
+        self._receipts[(user_id, channel_id)] = last_read_timestamp
+
+    async def get_read_receipts(self, user_id: str) -> Dict[str, str]:
+        return {channel: ts for (uid, channel), ts in self._receipts.items() if uid == user_id}
@@ -3,16 +3,18 @@ from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, EmailStr
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
-import boto3
-from botocore.exceptions import ClientError
+import asyncio
 import os
 from passlib.context import CryptContext
 from typing import Optional
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-import time
 import logging # <--- NOVO
+from chat_storage import (
+    CONTADORES_TABLE, HIERARQUIA_TABLE, READ_RECEIPTS_TABLE, ROLES, USUARIOS_TABLE,
+    AlreadyExistsError, ChatStorage, StorageError, create_storage,
+)
 
 # --- Configuração de Logs ---
 logging.basicConfig(
@@ -28,62 +30,30 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 IS_LOCAL = os.getenv("IS_LOCAL", "false").lower() == "true"
 
-def connect_with_retry(max_retries: int = 5, delay_seconds: int = 3):
-    last_exception = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            if IS_LOCAL:
-                logger.info(f"[DynamoDB] Tentativa {attempt}/{max_retries} - Conectando Local...")
-                return boto3.resource(
-                    'dynamodb',
-                    endpoint_url='http://dynamodb-local:8000',
-                    region_name='us-east-1',
-                    aws_access_key_id='dummykey',
-                    aws_secret_access_key='dummysecret'
-                )
-            else:
-                logger.info(f"[DynamoDB] Tentativa {attempt}/{max_retries} - Conectando AWS...")
-                return boto3.resource('dynamodb', region_name='us-east-1')
-        except Exception as exc:
-            last_exception = exc
-            logger.warning(f"[DynamoDB] Erro na conexão (tentativa {attempt}): {exc}")
-            if attempt < max_retries:
-                time.sleep(delay_seconds)
-    
-    logger.critical("Falha crítica ao conectar ao DynamoDB após várias tentativas.")
-    raise last_exception if last_exception else RuntimeError("Falha crítica no DynamoDB")
-
-dynamodb = connect_with_retry()
-
-USUARIOS_TABLE = dynamodb.Table('ChatUsuarios')
-HIERARQUIA_TABLE = dynamodb.Table('ChatHierarquia')
-CONTADORES_TABLE = dynamodb.Table('ChatContadores')
-READ_RECEIPTS_TABLE = dynamodb.Table('ChatReadReceipts')
+# Cliente criado sem tocar no banco; o pool só é aberto no lifespan.
+storage: ChatStorage = create_storage()
 
-def create_table_if_not_exists(table_name, key_schema, attribute_definitions):
+async def bootstrap_local_tables():
     try:
-        dynamodb.create_table(TableName=table_name, KeySchema=key_schema, AttributeDefinitions=attribute_definitions, ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5})
-        logger.info(f"Criando tabela '{table_name}'...")
-        table = dynamodb.Table(table_name)
-        table.wait_until_exists()
-    except ClientError: pass
+        logger.info(">>> MODO LOCAL: Verificando tabelas de Autenticação...")
+        await storage.ensure_tables([USUARIOS_TABLE, HIERARQUIA_TABLE, CONTADORES_TABLE, READ_RECEIPTS_TABLE])
+        await storage.init_counters(ROLES)
+        logger.info("Tabelas de Autenticação prontas.")
+    except StorageError as e:
+        logger.critical(f"Falha ao preparar tabelas de Autenticação: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await storage.start()
+    bootstrap_task = None
     if IS_LOCAL:
-        logger.info(">>> MODO LOCAL: Verificando tabelas de Autenticação...")
-        create_table_if_not_exists('ChatUsuarios', [{'AttributeName': 'email', 'KeyType': 'HASH'}], [{'AttributeName': 'email', 'AttributeType': 'S'}])
-        create_table_if_not_exists('ChatHierarquia', [{'AttributeName': 'id', 'KeyType': 'HASH'}], [{'AttributeName': 'id', 'AttributeType': 'S'}])
-        create_table_if_not_exists('ChatContadores', [{'AttributeName': 'role', 'KeyType': 'HASH'}], [{'AttributeName': 'role', 'AttributeType': 'S'}])
-        create_table_if_not_exists('ChatReadReceipts', [{'AttributeName': 'userId', 'KeyType': 'HASH'}, {'AttributeName': 'channelId', 'KeyType': 'RANGE'}], [{'AttributeName': 'userId', 'AttributeType': 'S'}, {'AttributeName': 'channelId', 'AttributeType': 'S'}])
-        
-        roles = ['director', 'manager', 'supervisor', 'employee']
-        for role in roles:
-            try:
-                CONTADORES_TABLE.put_item(Item={'role': role, 'count': 0}, ConditionExpression='attribute_not_exists(#r)', ExpressionAttributeNames={'#r': 'role'})
-            except ClientError: pass
+        # Em segundo plano: o serviço sobe sem esperar o DynamoDB Local ficar pronto.
+        bootstrap_task = asyncio.create_task(bootstrap_local_tables())
     logger.info("Serviço de Autenticação iniciado.")
     yield
+    if bootstrap_task and not bootstrap_task.done():
+        bootstrap_task.cancel()
+    await storage.close()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -129,27 +99,20 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_next_user_id(role: str) -> str:
+async def get_next_user_id(role: str) -> str:
     try:
-        response = CONTADORES_TABLE.update_item(
-            Key={'role': role},
-            UpdateExpression='SET #c = #c + :val',
-            ExpressionAttributeNames={'#c': 'count'},
-            ExpressionAttributeValues={':val': 1},
-            ReturnValues="UPDATED_NEW"
-        )
-        new_count = int(response['Attributes']['count'])
+        new_count = await storage.increment_counter(role)
         prefix = role[:3]
         if role == 'employee': prefix = 'emp'
         return f"{prefix}-{new_count}"
-    except ClientError as e:
+    except StorageError as e:
         logger.error(f"Erro ao gerar ID para role {role}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao gerar ID: {e}")
 
 @app.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     logger.info(f"Tentativa de registro para email: {user.email} (Role: {user.role})")
-    user_id = get_next_user_id(user.role)
+    user_id = await get_next_user_id(user.role)
     hashed_password = get_password_hash(user.password)
     
     user_document = {
@@ -161,26 +124,21 @@ async def register_user(user: UserCreate):
     }
 
     try:
-        USUARIOS_TABLE.put_item(Item=user_document, ConditionExpression='attribute_not_exists(email)')
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-            logger.warning(f"Tentativa de registro duplicado para email: {user.email}")
-            raise HTTPException(status_code=400, detail="Email já registrado")
+        await storage.create_user(user_document)
+    except AlreadyExistsError:
+        logger.warning(f"Tentativa de registro duplicado para email: {user.email}")
+        raise HTTPException(status_code=400, detail="Email já registrado")
+    except StorageError as e:
         logger.error(f"Erro DynamoDB ao registrar usuário: {e}")
         raise HTTPException(status_code=500, detail="Erro ao registrar usuário.")
 
     new_node = {"id": user_id, "name": user.name, "role": user.role, "email": user.email, "children": []}
     try:
         if user.manager_id:
-            HIERARQUIA_TABLE.update_item(
-                Key={'id': user.manager_id},
-                UpdateExpression='SET #children = list_append(if_not_exists(#children, :empty_list), :new_node)',
-                ExpressionAttributeNames={'#children': 'children'},
-                ExpressionAttributeValues={':new_node': [new_node], ':empty_list': []}
-            )
+            await storage.append_hierarchy_child(user.manager_id, new_node)
         else:
-            HIERARQUIA_TABLE.put_item(Item=new_node, ConditionExpression='attribute_not_exists(id)')
-    except ClientError: pass
+            await storage.add_hierarchy_root(new_node)
+    except StorageError: pass
 
     logger.info(f"Usuário registrado com sucesso: {user_id}")
     return {"message": "Usuário criado com sucesso!", "user_id": user_id}
@@ -188,9 +146,8 @@ async def register_user(user: UserCreate):
 @app.post("/login", response_model=Token)
 async def login(request: LoginRequest):
     try:
-        response = USUARIOS_TABLE.get_item(Key={'email': request.email})
-        user_record = response.get('Item')
-    except ClientError as e:
+        user_record = await storage.get_user(request.email)
+    except StorageError as e:
         logger.error(f"Erro ao buscar usuário no login: {e}")
         raise HTTPException(status_code=500, detail="Erro interno.")
 
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("msg-service")
+
+# --- Entrega Priorizada ---
+# Classes de saída, da mais prioritária para a menos: mensagens urgentes, mensagens
+# normais (inclui o initialState) e, por último, presença/recibos/eventos efêmeros.
+URGENT, NORMAL, BACKGROUND = 0, 1, 2
+CLASS_NAMES = {URGENT: "urgent", NORMAL: "normal", BACKGROUND: "background"}
+# Anti-starvation: a cabeça de uma classe inferior está "atrasada" depois de esperar isto.
+# Uma classe atrasada recebe um frame a cada STARVATION_BURST frames enviados na frente dela,
+# então ela nunca fica parada e as classes superiores mantêm a maior parte do socket.
+MAX_WAIT_SECONDS = {NORMAL: 0.25, BACKGROUND: 1.0}
+STARVATION_BURST = 8
+# Limite de frames enfileirados por classe. Estourou: BACKGROUND descarta o mais antigo;
+# nas classes de mensagem o cliente não está acompanhando e a conexão é fechada.
+MAX_QUEUED_FRAMES = {URGENT: 256, NORMAL: 1024, BACKGROUND: 256}
+# 1013 = "Try Again Later": o cliente reconecta (com backoff) e recebe o initialState.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Latências de entrega (recebimento no servidor -> envio no socket), janela deslizante por classe.
+delivery_latencies: Dict[int, deque] = {URGENT: deque(maxlen=1024), NORMAL: deque(maxlen=1024)}
+
+
+def latency_summary(samples: deque) -> Dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+    return {"count": len(ordered), "p50_ms": percentile(0.50), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+class OutboundQueue:
+    """Fila de saída de uma conexão. Um único writer envia os frames pela ordem de classe,
+    então um cliente lento só atrasa a si mesmo. Cada classe tem tamanho limitado."""
+
+    def __init__(self, websocket: Any):
+        self.websocket = websocket
+        self.alive = True
+        self._queues: List[deque] = [deque(), deque(), deque()]
+        # Frames enviados na frente da cabeça atrasada de cada classe (guarda anti-starvation).
+        self._sent_ahead = [0, 0, 0]
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._run())
+        self._closer: Optional[asyncio.Task] = None
+
+    def put(self, text: str, frame_class: int, received_at: Optional[float] = None):
+        if not self.alive:
+            return
+        queue = self._queues[frame_class]
+        if len(queue) >= MAX_QUEUED_FRAMES[frame_class]:
+            if frame_class != BACKGROUND:
+                logger.warning(f"WS: Fila {CLASS_NAMES[frame_class]} cheia; fechando conexão lenta.")
+                self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            queue.popleft()
+        queue.append((time.perf_counter(), received_at, text))
+        self._ready.set()
+
+    def _is_overdue(self, frame_class: int, now: float) -> bool:
+        queue = self._queues[frame_class]
+        return bool(queue) and now - queue[0][0] >= MAX_WAIT_SECONDS[frame_class]
+
+    def _next(self) -> Tuple[int, Tuple[float, Optional[float], str]]:
+        """Prioridade estrita, exceto por um frame de uma classe atrasada a cada STARVATION_BURST."""
+        now = time.perf_counter()
+        frame_class = next(c for c, queue in enumerate(self._queues) if queue)
+        for lower in range(frame_class + 1, len(self._queues)):
+            if self._is_overdue(lower, now) and self._sent_ahead[lower] >= STARVATION_BURST:
+                frame_class = lower
+                break
+        self._sent_ahead[frame_class] = 0
+        for lower in range(frame_class + 1, len(self._queues)):
+            if self._is_overdue(lower, now):
+                self._sent_ahead[lower] += 1
+        return frame_class, self._queues[frame_class].popleft()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            if not any(self._queues):
+                self._ready.clear()
+                continue
+            frame_class, (_, received_at, text) = self._next()
+            try: await self.websocket.send_text(text)
+            except Exception:
+                self.alive = False
+                return
+            if received_at is not None and frame_class in delivery_latencies:
+                delivery_latencies[frame_class].append(time.perf_counter() - received_at)
+
+    def queued(self) -> List[int]:
+        return [len(queue) for queue in self._queues]
+
+    def close(self, code: Optional[int] = None):
+        """Para o writer e descarta os frames pendentes. Com `code`, também fecha o websocket."""
+        self.alive = False
+        for queue in self._queues:
+            queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None and self._closer is None:
+            self._closer = asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try: await self.websocket.close(code=code)
+        except Exception: pass
+
+
+class EphemeralCoalescer:
+    """Throttle de eventos efêmeros por (usuário, canal).
+
+    O primeiro sinal sai na hora e abre uma janela. Dentro dela guarda-se o último frame
+    de cada `event` (no máximo `max_events` eventos distintos), enviados quando a janela
+    fecha; assim `typing:false` não é engolido por um `viewing:true` posterior.
+    Contrato: um frame com `state: null` limpa o evento; é o que `drop_user` envia para
+    cada evento ainda ativo quando o usuário sai.
+    """
+
+    def __init__(self, window_seconds: float, deliver: Callable[[Dict], None], max_events: int = 8):
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self._deliver = deliver
+        # chave -> {event: último frame} ainda não enviado na janela atual
+        self._pending: Dict[Tuple[str, str], Dict[str, Dict]] = {}
+        # chave -> task que fecha a janela atual; uma janela por chave
+        self._windows: Dict[Tuple[str, str], asyncio.Task] = {}
+        # chave -> eventos cujo último estado enviado não foi nulo/falso
+        self._active: Dict[Tuple[str, str], Set[str]] = {}
+
+    def submit(self, frame: Dict):
+        key = (frame["senderId"], frame["channelId"])
+        if key in self._windows:
+            pending = self._pending[key]
+            if frame["event"] in pending or len(pending) < self.max_events:
+                pending[frame["event"]] = frame
+            return
+        self._pending[key] = {}
+        self._windows[key] = asyncio.create_task(self._close_window(key))
+        self._send(key, frame)
+
+    async def _close_window(self, key: Tuple[str, str]):
+        try:
+            while True:
+                await asyncio.sleep(self.window_seconds)
+                frames = self._pending.get(key)
+                if not frames:
+                    return
+                self._pending[key] = {}
+                for frame in frames.values():
+                    self._send(key, frame)
+        finally:
+            if self._windows.get(key) is asyncio.current_task():
+                del self._windows[key]
+                self._pending.pop(key, None)
+
+    def _send(self, key: Tuple[str, str], frame: Dict):
+        active = self._active.setdefault(key, set())
+        if frame.get("state"):
+            active.add(frame["event"])
+        else:
+            active.discard(frame["event"])
+            if not active:
+                del self._active[key]
+        self._deliver(frame)
+
+    def drop_user(self, user_id: str):
+        """Cancela as janelas do usuário e envia `state: null` para os eventos ativos ou pendentes."""
+        keys = {k for k in self._windows if k[0] == user_id} | {k for k in self._active if k[0] == user_id}
+        for key in keys:
+            task = self._windows.pop(key, None)
+            if task is not None:
+                task.cancel()
+            events = self._active.pop(key, set()) | set(self._pending.pop(key, {}))
+            for event in sorted(events):
+                self._deliver({"type": "ephemeral", "event": event, "channelId": key[1], "senderId": user_id, "state": None})
@@ -1,15 +1,15 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
 from pydantic import BaseModel
 import json
-from datetime import datetime
-from typing import Dict, List, Set, Tuple
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
-from botocore.exceptions import ClientError
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
 import os
 from contextlib import asynccontextmanager
 import time
 import logging
+from delivery import BACKGROUND, CLASS_NAMES, NORMAL, URGENT, EphemeralCoalescer, OutboundQueue, delivery_latencies, latency_summary
+from chat_storage import MENSAGENS_TABLE, ChatStorage, MessageArchive, MessageHistory, StorageError, create_storage
 
 # --- Configuração de Logs ---
 logging.basicConfig(
@@ -18,35 +18,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("msg-service")
 
-def connect_with_retry(max_retries: int = 5, delay_seconds: int = 3):
-    """Tenta criar o recurso DynamoDB com retries simples e logs."""
-    last_exception = None
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            if IS_LOCAL:
-                logger.info(f"[DynamoDB] Tentativa {attempt}/{max_retries} - Conectando ao DynamoDB Local...")
-                return boto3.resource(
-                    'dynamodb',
-                    endpoint_url='http://dynamodb-local:8000',
-                    region_name='us-east-1',
-                    aws_access_key_id='dummykey',
-                    aws_secret_access_key='dummysecret'
-                )
-            else:
-                logger.info(f"[DynamoDB] Tentativa {attempt}/{max_retries} - Conectando ao AWS DynamoDB...")
-                return boto3.resource('dynamodb', region_name='us-east-1')
-        except Exception as exc:
-            last_exception = exc
-            logger.warning(f"[DynamoDB] Erro de conexão (tentativa {attempt}/{max_retries}): {exc}")
-
-            if attempt < max_retries:
-                logger.info(f"[DynamoDB] Aguardando {delay_seconds}s antes de tentar novamente...")
-                time.sleep(delay_seconds)
-
-    logger.critical("[DynamoDB] Todas as tentativas de conexão falharam. Abortando.")
-    raise last_exception if last_exception else RuntimeError("Falha desconhecida ao conectar ao DynamoDB")
-
 # --- Configuração do Banco ---
 IS_LOCAL = os.getenv("IS_LOCAL", "false").lower() == "true"
 
@@ -55,29 +26,82 @@ if IS_LOCAL:
 else:
     logger.info(">>> MODO DE PRODUÇÃO: Iniciando <<<")
 
-dynamodb = connect_with_retry()
+# Cliente criado sem tocar no banco; o pool só é aberto no lifespan.
+storage: ChatStorage = create_storage()
+
+# --- Arquivamento (tabela quente -> segmentos frios) ---
+# Desligado se ARCHIVE_DIR não estiver definido.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+ARCHIVE_MAX_AGE_DAYS = float(os.getenv("ARCHIVE_MAX_AGE_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
 
-HIERARQUIA_TABLE = dynamodb.Table('ChatHierarquia')
-MENSAGENS_TABLE = dynamodb.Table('ChatMensagens')
-READ_RECEIPTS_TABLE = dynamodb.Table('ChatReadReceipts')
+history = MessageHistory(storage, MessageArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None)
+
+async def archive_loop():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            await history.archive_older_than(timedelta(days=ARCHIVE_MAX_AGE_DAYS), batch_size=ARCHIVE_BATCH_SIZE)
+        except (StorageError, OSError) as e:
+            logger.error(f"Erro no arquivamento de mensagens: {e}")
+        except Exception:
+            # A tarefa não pode morrer em silêncio: registra e tenta de novo na próxima rodada.
+            logger.exception("Erro inesperado no arquivamento de mensagens")
 
 # --- Lifespan ---
-def create_table_if_not_exists(table_name, key_schema, attribute_definitions):
+async def bootstrap_local_tables():
     try:
-        dynamodb.create_table(TableName=table_name, KeySchema=key_schema, AttributeDefinitions=attribute_definitions, ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5})
-        table = dynamodb.Table(table_name)
-        table.wait_until_exists()
-    except ClientError: pass
+        await storage.ensure_tables([MENSAGENS_TABLE])
+    except StorageError as e:
+        logger.critical(f"Falha ao preparar tabela de mensagens: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await storage.start()
+    background_tasks = []
     if IS_LOCAL:
-        create_table_if_not_exists('ChatMensagens', [{'AttributeName': 'channelId', 'KeyType': 'HASH'}, {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}], [{'AttributeName': 'channelId', 'AttributeType': 'S'}, {'AttributeName': 'timestamp', 'AttributeType': 'S'}])
+        # Em segundo plano: o serviço aceita conexões sem esperar o DynamoDB Local.
+        background_tasks.append(asyncio.create_task(bootstrap_local_tables()))
+    if history.archive is not None:
+        background_tasks.append(asyncio.create_task(archive_loop()))
     logger.info("Serviço de Mensagens pronto para receber conexões.")
     yield
+    for task in background_tasks:
+        if not task.done():
+            task.cancel()
+    await storage.close()
 
 app = FastAPI(lifespan=lifespan)
-active_connections: Dict[str, WebSocket] = {}
+
+# Um usuário pode ter várias conexões abertas (abas, dispositivos); todas recebem os frames.
+active_connections: Dict[str, List[OutboundQueue]] = {}
+
+def enqueue(target_id: str, text: str, frame_class: int, received_at: Optional[float] = None):
+    for connection in active_connections.get(target_id, ()):
+        connection.put(text, frame_class, received_at)
+
+def register(user_id: str, connection: OutboundQueue):
+    active_connections.setdefault(user_id, []).append(connection)
+
+def disconnect(user_id: str, connection: OutboundQueue) -> bool:
+    """Encerra a fila da conexão. Retorna True se era a última conexão do usuário (ficou offline)."""
+    connection.close()
+    connections = active_connections.get(user_id, [])
+    if connection in connections:
+        connections.remove(connection)
+        if not connections:
+            del active_connections[user_id]
+            return True
+    return False
+
+# Última hierarquia lida do banco; eventos efêmeros usam esta cópia para não gerar I/O.
+cached_hierarchy: List[Dict] = []
+
+# --- Eventos Efêmeros (digitando, visualizando...) ---
+# Nunca persistidos. Por (usuário, canal) e janela: o primeiro sinal na hora e depois o último
+# estado de cada evento (veja EphemeralCoalescer).
+EPHEMERAL_WINDOW_SECONDS = float(os.getenv("EPHEMERAL_WINDOW_SECONDS", "0.3"))
 
 # ✅ Middleware de Logs
 @app.middleware("http")
@@ -91,10 +115,11 @@ async def log_requests(request: Request, call_next):
     return response
 
 async def fetch_hierarchy_from_db():
+    global cached_hierarchy
     try:
-        response = HIERARQUIA_TABLE.scan()
-        return response.get('Items', [])
-    except ClientError as e:
+        cached_hierarchy = await storage.get_hierarchy()
+        return cached_hierarchy
+    except StorageError as e:
         logger.error(f"Erro ao buscar hierarquia: {e}")
         return []
 
@@ -118,11 +143,44 @@ def get_group_members_ids(channel_id: str, hierarchy: List[Dict]) -> List[str]:
     find_users_by_role(hierarchy)
     return list(set(member_ids))
 
+GROUP_CHANNELS = {'group-directors', 'group-managers', 'group-supervisors', 'group-employees'}
+
+def get_private_members(channel_id: str) -> Set[str]:
+    parts = channel_id.replace("private-", "").split("-")
+    return {"-".join(parts[:2]), "-".join(parts[2:])}
+
+def is_known_channel(channel_id: str, user_id: str) -> bool:
+    """Canal existente para o usuário: o geral, um grupo conhecido ou um privado do qual ele participa."""
+    if channel_id == 'general-chat' or channel_id in GROUP_CHANNELS:
+        return True
+    return channel_id.startswith("private-") and user_id in get_private_members(channel_id)
+
+def get_channel_targets(channel_id: str, hierarchy: List[Dict]) -> Set[str]:
+    targets: Set[str] = set()
+    if channel_id.startswith("group-"):
+        targets.update(get_group_members_ids(channel_id, hierarchy))
+    elif channel_id.startswith("private-"):
+        targets.update(get_private_members(channel_id))
+    elif channel_id == 'general-chat':
+        targets.update(active_connections.keys())
+    return targets
+
+def send_to_targets(frame: Dict, targets: Set[str], sender_id: str, frame_class: int, received_at: Optional[float] = None):
+    text = json.dumps(frame)
+    for target_id in targets:
+        if target_id != sender_id:
+            enqueue(target_id, text, frame_class, received_at)
+
+def deliver_ephemeral(frame: Dict):
+    targets = get_channel_targets(frame["channelId"], cached_hierarchy)
+    send_to_targets(frame, targets, frame["senderId"], BACKGROUND)
+
+ephemeral_events = EphemeralCoalescer(EPHEMERAL_WINDOW_SECONDS, deliver_ephemeral)
+
 async def broadcast_status_update(user_id: str, status: str):
-    message = {"type": "status_update", "payload": {"userId": user_id, "status": status}}
-    for connection in active_connections.values():
-        try: await connection.send_text(json.dumps(message))
-        except Exception: pass
+    text = json.dumps({"type": "status_update", "payload": {"userId": user_id, "status": status}})
+    for target_id in list(active_connections):
+        enqueue(target_id, text, BACKGROUND)
 
 def update_statuses_in_hierarchy(nodes: List[Dict], online_users: List[str]):
     for node in nodes:
@@ -139,20 +197,17 @@ async def fetch_initial_data(user_id: str, user_role: str) -> Tuple[List[Dict],
     all_messages = []
     for channel in channels_to_query:
         try:
-            response = MENSAGENS_TABLE.query(KeyConditionExpression=Key('channelId').eq(channel), Limit=50, ScanIndexForward=False)
-            all_messages.extend(response.get('Items', []))
-        except ClientError: pass
+            all_messages.extend(await history.get_channel_history(channel, limit=50))
+        except (StorageError, OSError): pass
 
     try:
-        response = MENSAGENS_TABLE.scan(FilterExpression=Attr('channelId').contains(user_id) & Attr('channelId').begins_with('private-'))
-        all_messages.extend(response.get('Items', []))
-    except ClientError: pass
+        all_messages.extend(await history.get_private_history(user_id, limit=50))
+    except (StorageError, OSError): pass
 
     read_receipts = {}
     try:
-        response = READ_RECEIPTS_TABLE.query(KeyConditionExpression=Key('userId').eq(user_id))
-        for item in response.get('Items', []): read_receipts[item['channelId']] = item['lastReadTimestamp']
-    except ClientError: pass
+        read_receipts = await storage.get_read_receipts(user_id)
+    except StorageError: pass
 
     unread_counts = {}
     for msg in all_messages:
@@ -169,12 +224,14 @@ async def fetch_initial_data(user_id: str, user_role: str) -> Tuple[List[Dict],
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     user_id = None
+    connection = None
     try:
         initial_payload = await websocket.receive_json()
         if (initial_payload.get("type") == "user_connect" and initial_payload.get("userId") and initial_payload.get("role")):
             user_id = initial_payload["userId"]
             user_role = initial_payload["role"]
-            active_connections[user_id] = websocket
+            connection = OutboundQueue(websocket)
+            register(user_id, connection)
             await broadcast_status_update(user_id, "online")
             
             hierarchy_data = await fetch_hierarchy_from_db()
@@ -182,7 +239,7 @@ async def websocket_endpoint(websocket: WebSocket):
             messages_data, unread_counts = await fetch_initial_data(user_id, user_role)
             
             initial_state = {"hierarchy": hierarchy_data, "messages": messages_data, "unreadCounts": unread_counts}
-            await websocket.send_text(json.dumps({"type": "initialState", "payload": initial_state}))
+            connection.put(json.dumps({"type": "initialState", "payload": initial_state}), NORMAL)
             
             logger.info(f"WS: Usuário conectado: {user_id}")
         else:
@@ -198,47 +255,52 @@ async def websocket_endpoint(websocket: WebSocket):
                 channel_id_to_mark = message_data.get("channelId")
                 if user_id and channel_id_to_mark:
                     try:
-                        READ_RECEIPTS_TABLE.put_item(Item={'userId': user_id, 'channelId': channel_id_to_mark, 'lastReadTimestamp': datetime.now().isoformat()})
-                    except ClientError: pass
+                        await storage.put_read_receipt(user_id, channel_id_to_mark, datetime.now().isoformat())
+                    except StorageError: pass
 
             elif message_data.get("type") == "message":
+                received_at = time.perf_counter()
                 message_data["id"] = f"msg-servidor-{datetime.now().timestamp()}"
                 message_data["timestamp"] = datetime.now().isoformat()
                 try:
-                    MENSAGENS_TABLE.put_item(Item=message_data)
+                    await storage.put_message(message_data)
                     logger.info(f"Msg salva: {message_data.get('senderId')} -> {message_data.get('channelId')}")
-                except ClientError as e:
+                except StorageError as e:
                     logger.error(f"Erro ao salvar mensagem: {e}")
                 
                 channel_id = message_data.get("channelId", "")
-                sender_id = message_data.get("senderId")
-                targets: Set[str] = set()
-                
-                if channel_id.startswith("group-"):
-                    current_hierarchy = await fetch_hierarchy_from_db()
-                    group_members = get_group_members_ids(channel_id, current_hierarchy)
-                    for member_id in group_members: targets.add(member_id)
-                elif channel_id.startswith("private-"):
-                    parts = channel_id.replace("private-", "").split("-")
-                    targets.add("-".join(parts[:2]))
-                    targets.add("-".join(parts[2:]))
-                elif channel_id == 'general-chat':
-                    targets.update(active_connections.keys())
-                        
-                for target_id in targets:
-                    if target_id != sender_id and target_id in active_connections:
-                        try: await active_connections[target_id].send_text(json.dumps(message_data))
-                        except Exception: pass
+                current_hierarchy = await fetch_hierarchy_from_db() if channel_id.startswith("group-") else cached_hierarchy
+                targets = get_channel_targets(channel_id, current_hierarchy)
+                frame_class = URGENT if message_data.get("priority") == "urgent" else NORMAL
+                send_to_targets(message_data, targets, message_data.get("senderId"), frame_class, received_at)
+
+            elif message_data.get("type") == "ephemeral":
+                channel_id = message_data.get("channelId")
+                event = message_data.get("event")
+                if not (isinstance(channel_id, str) and isinstance(event, str) and event and is_known_channel(channel_id, user_id)):
+                    continue
+                # Sem destinatário conectado não há o que enviar nem janela a abrir.
+                targets = get_channel_targets(channel_id, cached_hierarchy)
+                if not any(target_id != user_id and target_id in active_connections for target_id in targets):
+                    continue
+                ephemeral_events.submit({
+                    "type": "ephemeral",
+                    "event": event,
+                    "channelId": channel_id,
+                    "senderId": user_id,
+                    "state": message_data.get("state"),
+                })
 
     except WebSocketDisconnect:
-        if user_id and user_id in active_connections:
-            del active_connections[user_id]
+        if user_id and connection and disconnect(user_id, connection):
+            ephemeral_events.drop_user(user_id)
             await broadcast_status_update(user_id, "offline")
             logger.info(f"WS: Usuário desconectado: {user_id}")
     except Exception as e:
         logger.error(f"Erro inesperado no WebSocket: {e}")
-        if user_id and user_id in active_connections:
-             del active_connections[user_id]
+        if user_id and connection and disconnect(user_id, connection):
+            ephemeral_events.drop_user(user_id)
+            await broadcast_status_update(user_id, "offline")
 
 class UserInfo(BaseModel):
     id: str
@@ -250,6 +312,20 @@ async def user_connected(info: UserInfo):
     logger.info(f"Notificação Interna: User connected {info.id}")
     return {"message": "Notification received"}
 
+@app.get("/metrics")
+async def metrics():
+    """Latência de entrega por classe (últimos 1024 frames) e tamanho atual das filas de saída."""
+    queued = {name: 0 for name in CLASS_NAMES.values()}
+    for connection in (c for connections in active_connections.values() for c in connections):
+        for frame_class, size in enumerate(connection.queued()):
+            queued[CLASS_NAMES[frame_class]] += size
+    return {
+        "urgent_delivery_latency": latency_summary(delivery_latencies[URGENT]),
+        "normal_delivery_latency": latency_summary(delivery_latencies[NORMAL]),
+        "outbound_queued": queued,
+        "connections": sum(len(connections) for connections in active_connections.values()),
+    }
+
 # ✅ Endpoint de Health Check (Novo)
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,28 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Os serviços não são pacotes instaláveis: expõe `chat_storage` e os módulos do servico-mensagens.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'servico-mensagens'))
+
+
+@pytest.fixture
+def run():
+    """Executa uma corrotina num event loop novo (sem depender de pytest-asyncio)."""
+    return asyncio.run
+
+
+def make_message(i, channel_id='general-chat', timestamp=None, **extra):
+    return {
+        'id': f'm{i}',
+        'channelId': channel_id,
+        'senderId': 'dir-1',
+        'content': f'mensagem {i}',
+        'priority': 'normal',
+        'timestamp': timestamp or f'2026-01-01T00:{i // 60:02d}:{i % 60:02d}',
+        **extra,
+    }
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from chat_storage import MessageArchive, StorageError
+from conftest import make_message
+
+
+def _ids(messages):
+    return [m['id'] for m in messages]
+
+
+def test_append_and_read_newest_first(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    written = archive.append([make_message(i) for i in range(10)] + [make_message(50, channel_id='group-managers')])
+
+    assert written == 11
+    assert _ids(archive.read('general-chat', limit=3)) == ['m9', 'm8', 'm7']
+    assert _ids(archive.read('group-managers')) == ['m50']
+    assert archive.read('canal-inexistente') == []
+    assert sorted(archive.channels()) == ['general-chat', 'group-managers']
+
+
+def test_segments_are_partitioned_by_day(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    archive.append([
+        make_message(1, timestamp='2026-01-01T10:00:00'),
+        make_message(2, timestamp='2026-01-02T10:00:00'),
+    ])
+
+    assert sorted(os.listdir(tmp_path)) == ['2026-01-01.idx', '2026-01-01.seg', '2026-01-02.idx', '2026-01-02.seg']
+    assert _ids(archive.read('general-chat')) == ['m2', 'm1']
+
+
+def test_read_paginates_with_before_across_blocks(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    # Várias rodadas, com blocos que se sobrepõem no tempo.
+    archive.append([make_message(i) for i in range(0, 20, 2)])
+    archive.append([make_message(i) for i in range(1, 20, 2)])
+
+    pages, before = [], None
+    while True:
+        page = archive.read('general-chat', limit=6, before=before)
+        if not page:
+            break
+        pages.append(_ids(page))
+        before = page[-1]['timestamp']
+
+    assert [m for page in pages for m in page] == [f'm{i}' for i in range(19, -1, -1)]
+    assert [len(page) for page in pages] == [6, 6, 6, 2]
+
+
+def test_append_is_idempotent(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    messages = [make_message(i) for i in range(5)]
+    archive.append(messages)
+
+    # Rodada repetida após uma falha ao apagar da tabela quente.
+    assert archive.append(messages[2:4]) == 0
+    assert archive.append(messages[3:] + [make_message(5)]) == 1
+    assert _ids(archive.read('general-chat')) == ['m5', 'm4', 'm3', 'm2', 'm1', 'm0']
+
+
+def test_read_deduplicates_existing_duplicate_blocks(tmp_path, monkeypatch):
+    archive = MessageArchive(str(tmp_path))
+    archive.append([make_message(i) for i in range(3)])
+    # Simula arquivos gravados sem a verificação de idempotência.
+    monkeypatch.setattr(archive, '_archived_ids', lambda *args: set())
+    archive.append([make_message(1)])
+
+    assert _ids(archive.read('general-chat', limit=3)) == ['m2', 'm1', 'm0']
+
+
+def test_index_is_reloaded_from_disk(tmp_path):
+    MessageArchive(str(tmp_path)).append([make_message(i) for i in range(4)])
+    reopened = MessageArchive(str(tmp_path))
+
+    assert _ids(reopened.read('general-chat')) == ['m3', 'm2', 'm1', 'm0']
+    assert reopened.append([make_message(3)]) == 0
+
+
+def test_truncated_index_line_is_ignored(tmp_path):
+    MessageArchive(str(tmp_path)).append([make_message(1)])
+    with open(tmp_path / '2026-01-01.idx', 'a', encoding='utf-8') as idx:
+        idx.write('{"channelId": "general-chat", "offs')
+
+    assert _ids(MessageArchive(str(tmp_path)).read('general-chat')) == ['m1']
+
+
+def test_corrupted_block_raises_storage_error(tmp_path):
+    MessageArchive(str(tmp_path)).append([make_message(1)])
+    with open(tmp_path / '2026-01-01.seg', 'r+b') as seg:
+        seg.seek(6)
+        seg.write(b'corrompido')
+
+    with pytest.raises(StorageError):
+        MessageArchive(str(tmp_path)).read('general-chat')
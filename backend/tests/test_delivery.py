@@ -0,0 +1,215 @@
+import asyncio
+
+from delivery import (
+    BACKGROUND,
+    MAX_QUEUED_FRAMES,
+    NORMAL,
+    SLOW_CONSUMER_CLOSE_CODE,
+    STARVATION_BURST,
+    URGENT,
+    EphemeralCoalescer,
+    OutboundQueue,
+)
+
+
+class FakeWebSocket:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.closed_with = None
+        self.fail = fail
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError('socket fechado')
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def _drain(queue):
+    """Ordem em que o writer enviaria os frames já enfileirados."""
+    order = []
+    while any(queue.queued()):
+        order.append(queue._next()[1][2])
+    return order
+
+
+def _age(queue, frame_class, seconds):
+    queue._queues[frame_class] = type(queue._queues[frame_class])(
+        (enqueued_at - seconds, received_at, text) for enqueued_at, received_at, text in queue._queues[frame_class]
+    )
+
+
+def test_strict_priority_when_nothing_is_overdue(run):
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket())
+        queue.put('b1', BACKGROUND)
+        queue.put('n1', NORMAL)
+        queue.put('u1', URGENT)
+        queue.put('n2', NORMAL)
+        queue.put('u2', URGENT)
+        order = _drain(queue)
+        queue.close()
+        return order
+
+    assert run(scenario()) == ['u1', 'u2', 'n1', 'n2', 'b1']
+
+
+def test_fresh_urgent_beats_overdue_normal_backlog(run):
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket())
+        for i in range(200):
+            queue.put(f'n{i}', NORMAL)
+        _age(queue, NORMAL, 5.0)
+        queue.put('urgent', URGENT)
+        order = _drain(queue)
+        queue.close()
+        return order
+
+    assert run(scenario())[0] == 'urgent'
+
+
+def test_starvation_guard_gives_overdue_class_a_bounded_share(run):
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket())
+        for i in range(40):
+            queue.put(f'u{i}', URGENT)
+        for i in range(3):
+            queue.put(f'b{i}', BACKGROUND)
+        _age(queue, BACKGROUND, 5.0)
+        order = _drain(queue)
+        queue.close()
+        return order
+
+    order = run(scenario())
+    positions = [i for i, text in enumerate(order) if text.startswith('b')]
+    assert positions == [STARVATION_BURST, 2 * STARVATION_BURST + 1, 3 * STARVATION_BURST + 2]
+
+
+def test_writer_sends_in_priority_order(run):
+    async def scenario():
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        queue = OutboundQueue(ws)
+        queue.put('presence', BACKGROUND)
+        queue.put('initialState', NORMAL)
+        queue.put('urgent', URGENT)
+        ws.gate.set()
+        await asyncio.sleep(0.01)
+        queue.close()
+        return ws.sent
+
+    assert run(scenario()) == ['urgent', 'initialState', 'presence']
+
+
+def test_background_overflow_drops_oldest(run):
+    async def scenario():
+        ws = FakeWebSocket()
+        queue = OutboundQueue(ws)
+        for i in range(MAX_QUEUED_FRAMES[BACKGROUND] + 10):
+            queue.put(f'b{i}', BACKGROUND)
+        head = queue._queues[BACKGROUND][0][2]
+        alive = queue.alive
+        queue.close()
+        return head, alive
+
+    assert run(scenario()) == ('b10', True)
+
+
+def test_message_overflow_closes_slow_connection(run):
+    async def scenario():
+        ws = FakeWebSocket()
+        queue = OutboundQueue(ws)
+        for i in range(MAX_QUEUED_FRAMES[NORMAL] + 1):
+            queue.put(f'n{i}', NORMAL)
+        await asyncio.sleep(0)
+        queue.put('depois', URGENT)
+        return queue.alive, queue.queued(), ws.closed_with
+
+    assert run(scenario()) == (False, [0, 0, 0], SLOW_CONSUMER_CLOSE_CODE)
+
+
+def test_queue_is_dead_after_send_error(run):
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket(fail=True))
+        queue.put('primeiro', NORMAL)
+        await asyncio.sleep(0.01)
+        queue.put('ignorado', NORMAL)
+        return queue.alive, queue.queued()
+
+    assert run(scenario()) == (False, [0, 0, 0])
+
+
+def _frame(event, state, channel_id='general-chat', sender_id='man-1'):
+    return {'type': 'ephemeral', 'event': event, 'channelId': channel_id, 'senderId': sender_id, 'state': state}
+
+
+def _states(frames):
+    return [(f['event'], f['state']) for f in frames]
+
+
+def test_coalescer_sends_first_then_latest_per_event(run):
+    async def scenario():
+        sent = []
+        coalescer = EphemeralCoalescer(0.05, sent.append)
+        for i in range(20):
+            coalescer.submit(_frame('typing', i))
+        coalescer.submit(_frame('typing', False))
+        coalescer.submit(_frame('viewing', True))
+        await asyncio.sleep(0.15)
+        return sent, coalescer._windows
+
+    sent, windows = run(scenario())
+    assert _states(sent) == [('typing', 0), ('typing', False), ('viewing', True)]
+    assert windows == {}
+
+
+def test_coalescer_windows_are_per_user_and_channel(run):
+    async def scenario():
+        sent = []
+        coalescer = EphemeralCoalescer(0.05, sent.append)
+        coalescer.submit(_frame('typing', True))
+        coalescer.submit(_frame('typing', True, channel_id='group-managers'))
+        coalescer.submit(_frame('typing', True, sender_id='dir-1'))
+        await asyncio.sleep(0.1)
+        return sent
+
+    assert len(run(scenario())) == 3
+
+
+def test_coalescer_caps_distinct_events_per_window(run):
+    async def scenario():
+        sent = []
+        coalescer = EphemeralCoalescer(0.05, sent.append, max_events=2)
+        coalescer.submit(_frame('typing', True))
+        for i in range(10):
+            coalescer.submit(_frame(f'evento-{i}', True))
+        await asyncio.sleep(0.1)
+        return sent
+
+    assert len(run(scenario())) == 3
+
+
+def test_drop_user_clears_active_events_and_cancels_windows(run):
+    async def scenario():
+        sent = []
+        coalescer = EphemeralCoalescer(0.05, sent.append)
+        coalescer.submit(_frame('typing', True))
+        coalescer.submit(_frame('typing', False))
+        coalescer.submit(_frame('viewing', True))
+        coalescer.drop_user('man-1')
+        after_drop = len(sent)
+        # Reconexão dentro da mesma janela: a janela antiga não pode interferir.
+        coalescer.submit(_frame('typing', True))
+        coalescer.submit(_frame('typing', False))
+        await asyncio.sleep(0.15)
+        return sent, after_drop, coalescer
+
+    sent, after_drop, coalescer = run(scenario())
+    assert _states(sent[:after_drop]) == [('typing', True), ('typing', None), ('viewing', None)]
+    assert _states(sent[after_drop:]) == [('typing', True), ('typing', False)]
+    assert coalescer._windows == {} and coalescer._pending == {} and coalescer._active == {}
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from chat_storage import InMemoryStorage, MessageArchive, MessageHistory
+from conftest import make_message
+
+NOW = datetime.now()
+
+
+def _at(days_ago, i=0):
+    return (NOW - timedelta(days=days_ago) + timedelta(minutes=i)).isoformat()
+
+
+def _ids(messages):
+    return [m['id'] for m in messages]
+
+
+async def _seed(storage, channel_id, start, count, days_ago):
+    for i in range(start, start + count):
+        await storage.put_message(make_message(i, channel_id=channel_id, timestamp=_at(days_ago, i)))
+
+
+def test_channel_history_reads_hot_then_archive(run, tmp_path):
+    async def scenario():
+        storage = InMemoryStorage()
+        history = MessageHistory(storage, MessageArchive(str(tmp_path)))
+        await _seed(storage, 'general-chat', 0, 10, days_ago=40)
+        await _seed(storage, 'general-chat', 10, 3, days_ago=1)
+        moved = await history.archive_older_than(timedelta(days=30), batch_size=4)
+
+        first = await history.get_channel_history('general-chat', limit=5)
+        second = await history.get_channel_history('general-chat', limit=5, before=first[-1]['timestamp'])
+        hot = await storage.get_channel_messages('general-chat')
+        return moved, first, second, hot
+
+    moved, first, second, hot = run(scenario())
+    assert moved == 10
+    assert _ids(hot) == ['m12', 'm11', 'm10']
+    assert _ids(first) == ['m12', 'm11', 'm10', 'm9', 'm8']
+    assert _ids(second) == ['m7', 'm6', 'm5', 'm4', 'm3']
+
+
+def test_channel_history_without_archive_is_hot_only(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        history = MessageHistory(storage)
+        await _seed(storage, 'general-chat', 0, 3, days_ago=40)
+        return await history.archive_older_than(timedelta(days=30)), await history.get_channel_history('general-chat')
+
+    moved, messages = run(scenario())
+    assert moved == 0
+    assert _ids(messages) == ['m2', 'm1', 'm0']
+
+
+def test_private_history_includes_archived_channels(run, tmp_path):
+    async def scenario():
+        storage = InMemoryStorage()
+        history = MessageHistory(storage, MessageArchive(str(tmp_path)))
+        await _seed(storage, 'private-dir-1-man-1', 0, 3, days_ago=40)
+        await _seed(storage, 'private-dir-1-man-1', 3, 1, days_ago=1)
+        # Canal que só existe no arquivo.
+        await _seed(storage, 'private-man-1-sup-1', 10, 2, days_ago=40)
+        await _seed(storage, 'private-dir-1-sup-1', 20, 2, days_ago=40)
+        await history.archive_older_than(timedelta(days=30))
+
+        return await history.get_private_history('man-1'), await history.get_private_history('emp-1')
+
+    man_1, emp_1 = run(scenario())
+    assert sorted(_ids(man_1)) == ['m0', 'm1', 'm10', 'm11', 'm2', 'm3']
+    assert emp_1 == []
+
+
+def test_archive_pass_retry_does_not_duplicate(run, tmp_path):
+    async def scenario():
+        storage = InMemoryStorage()
+        history = MessageHistory(storage, MessageArchive(str(tmp_path)))
+        await _seed(storage, 'general-chat', 0, 5, days_ago=40)
+        await history.archive_older_than(timedelta(days=30))
+        # Simula um delete que falhou: a mensagem volta para a tabela quente e a rodada se repete.
+        await storage.put_message(make_message(3, timestamp=_at(40, 3)))
+        moved_again = await history.archive_older_than(timedelta(days=30))
+        return moved_again, await history.get_channel_history('general-chat')
+
+    moved_again, messages = run(scenario())
+    assert moved_again == 1
+    assert _ids(messages) == ['m4', 'm3', 'm2', 'm1', 'm0']
@@ -0,0 +1,101 @@
+import pytest
+
+from chat_storage import AlreadyExistsError, InMemoryStorage
+from conftest import make_message
+
+
+async def _collect(storage, cutoff, batch_size):
+    return [batch async for batch in storage.iter_messages_before(cutoff, batch_size=batch_size)]
+
+
+def test_channel_messages_newest_first_with_limit_and_before(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        for i in range(10):
+            await storage.put_message(make_message(i))
+        await storage.put_message(make_message(99, channel_id='group-managers'))
+
+        newest = await storage.get_channel_messages('general-chat', limit=3)
+        older = await storage.get_channel_messages('general-chat', limit=3, before=newest[-1]['timestamp'])
+        return newest, older
+
+    newest, older = run(scenario())
+    assert [m['id'] for m in newest] == ['m9', 'm8', 'm7']
+    assert [m['id'] for m in older] == ['m6', 'm5', 'm4']
+
+
+def test_put_message_overwrites_same_channel_and_timestamp(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        await storage.put_message(make_message(1))
+        await storage.put_message(make_message(1, content='editada'))
+        return await storage.get_channel_messages('general-chat')
+
+    messages = run(scenario())
+    assert len(messages) == 1
+    assert messages[0]['content'] == 'editada'
+
+
+def test_iter_messages_before_batches_and_cutoff(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        for i in range(7):
+            await storage.put_message(make_message(i))
+            await storage.put_message(make_message(i + 100, channel_id='private-dir-1-man-1', timestamp=make_message(i)['timestamp']))
+        return await _collect(storage, make_message(5)['timestamp'], batch_size=4)
+
+    batches = run(scenario())
+    assert [len(b) for b in batches] == [4, 4, 2]
+    ids = {m['id'] for batch in batches for m in batch}
+    assert ids == {f'm{i}' for i in range(5)} | {f'm{i + 100}' for i in range(5)}
+
+
+def test_delete_messages_during_iteration(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        for i in range(6):
+            await storage.put_message(make_message(i))
+        async for batch in storage.iter_messages_before('9999', batch_size=2):
+            await storage.delete_messages(batch)
+        # Apagar algo que não existe é ignorado.
+        await storage.delete_messages([make_message(42)])
+        return await storage.get_channel_messages('general-chat'), await _collect(storage, '9999', 10)
+
+    remaining, batches = run(scenario())
+    assert remaining == []
+    assert batches == []
+
+
+def test_returned_items_are_copies(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        await storage.put_message(make_message(1))
+        (message,) = await storage.get_channel_messages('general-chat')
+        message['content'] = 'alterada fora do storage'
+        return await storage.get_channel_messages('general-chat')
+
+    assert run(scenario())[0]['content'] == 'mensagem 1'
+
+
+def test_users_counters_and_hierarchy(run):
+    async def scenario():
+        storage = InMemoryStorage()
+        await storage.init_counters(['director'])
+        ids = [await storage.increment_counter('director') for _ in range(2)]
+        user = {'id': 'dir-1', 'email': 'adm@empresa.com', 'hashed_password': 'x', 'name': 'Adm', 'role': 'director'}
+        await storage.create_user(user)
+        with pytest.raises(AlreadyExistsError):
+            await storage.create_user(user)
+        await storage.add_hierarchy_root({'id': 'dir-1', 'children': []})
+        with pytest.raises(AlreadyExistsError):
+            await storage.add_hierarchy_root({'id': 'dir-1', 'children': []})
+        await storage.append_hierarchy_child('dir-1', {'id': 'man-1'})
+        # Como o update_item do DynamoDB, cria o gerente se ele não existir.
+        await storage.append_hierarchy_child('man-9', {'id': 'sup-1'})
+        return ids, await storage.get_user('adm@empresa.com'), await storage.get_hierarchy()
+
+    ids, user, hierarchy = run(scenario())
+    assert ids == [1, 2]
+    assert user['id'] == 'dir-1'
+    assert {'id': 'dir-1', 'children': [{'id': 'man-1'}]} in hierarchy
+    assert {'id': 'man-9', 'children': [{'id': 'sup-1'}]} in hierarchy